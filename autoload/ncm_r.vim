@@ -5,7 +5,7 @@ let s:loaded = 1
 
 let g:ncm_r#proc = yarp#py3({
     \ 'module': 'ncm_r',
-    \ 'on_load': { -> ncm2#set_ready(g:ncm_r#source)}
+    \ 'on_load': { -> ncm_r#on_load()}
 \ })
 
 let g:ncm_r#source = extend(get(g:, 'ncm_r', {}), {
@@ -29,6 +29,26 @@ function! ncm_r#init()
   call ncm2#register_source(g:ncm_r#source)
 endfunction
 
+function! ncm_r#on_load()
+  call ncm2#set_ready(g:ncm_r#source)
+
+  " Push loaded R packages whenever Nvim-R updates them, so that ncm-R doesn't
+  " have to ask for them on every completion (Neovim only)
+  if exists('*dictwatcheradd') && !get(s:, 'watching_libs', 0)
+    let s:watching_libs = 1
+    call dictwatcheradd(g:, 'rplugin_loaded_libs', 'ncm_r#on_loaded_libs')
+
+    if exists('g:rplugin_loaded_libs')
+      call ncm_r#on_loaded_libs()
+    endif
+  endif
+endfunction
+
+function! ncm_r#on_loaded_libs(...)
+  call g:ncm_r#proc.try_notify('on_loaded_libs',
+        \ get(g:, 'rplugin_loaded_libs', []))
+endfunction
+
 function! ncm_r#on_warmup(ctx)
   call g:ncm_r#proc.jobstart()
 endfunction
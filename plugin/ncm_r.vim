@@ -10,3 +10,8 @@ let $NCM_R = 'TRUE'
 let g:ncm_r_column_layout = get(g:, 'ncm_r_column_layout', 1)
 let g:ncm_r_column1_length = get(g:, 'ncm_r_column1_length', 13)
 let g:ncm_r_column2_length = get(g:, 'ncm_r_column2_length', 11)
+let g:ncm_r_fuzzy_matching = get(g:, 'ncm_r_fuzzy_matching', 0)
+let g:ncm_r_lazy_loading = get(g:, 'ncm_r_lazy_loading', 1)
+let g:ncm_r_lookback_lines = get(g:, 'ncm_r_lookback_lines', 100)
+let g:ncm_r_max_matches = get(g:, 'ncm_r_max_matches', 500)
+let g:ncm_r_parallel_loading = get(g:, 'ncm_r_parallel_loading', 0)
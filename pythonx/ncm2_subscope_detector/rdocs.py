@@ -5,78 +5,314 @@ Rmarkdown and Rnoweb Scoper for ncm2
 by Gabriel Alcaras
 """
 
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
 import re
 import copy
 from ncm2 import Ncm2Base, getLogger # pylint: disable=E0401
 
 LOGGER = getLogger(__name__)
 
+R_CHUNK = re.compile(
+    r'^((`{3})|(<<)) \s* (?(2)\{r)([^\n]*) \s* \n'
+    r'(.*?)'
+    r'^(?(3)@|\2) \s* (?:\n+|$)', re.M | re.X | re.S)
 
-class SubscopeDetector(Ncm2Base):  # pylint: disable=too-few-public-methods
+# Only lines starting with these can open or close a chunk
+FENCES = ('```', '<<', '@')
 
-    """Scoper for RMarkdown and Rnoweb"""
 
-    scope = ['rmd', 'rnoweb']
+def common_prefix(old, new):
+    """Return length of the common prefix of two strings, comparing halves
+    of the remaining part at each step"""
 
-    def get_scope(self, lnum, ccol, src):
-        """Identify scope"""
+    low, high = 0, min(len(old), len(new))
 
-        scope = None
-        cur_pos = self.lccol2pos(lnum, ccol, src)
+    while low < high:
+        mid = (low + high + 1) // 2
 
-        pat = re.compile(
-            r'^((`{3})|(<<)) \s* (?(2)\{r)([^\n]*) \s* \n'
-            r'(.*?)'
-            r'^(?(3)@|\2) \s* (?:\n+|$)', re.M | re.X | re.S)
+        if old[low:mid] == new[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
 
-        groups = {4: 'rchunk', 5: 'r'}
+    return low
 
-        for chunk in pat.finditer(src):
-            if chunk.start() > cur_pos:
-                break
 
-            for grp_nb, grp_scope in groups.items():
-                group = chunk.group(grp_nb)
-                start = chunk.start(grp_nb)
+def common_suffix(old, new, limit):
+    """Return length of the common suffix of two strings, at most limit"""
 
-                if group and start <= cur_pos <= chunk.end(grp_nb):
-                    scope = dict(src=group, pos=cur_pos-start,
-                                 scope_offset=start, scope=grp_scope)
+    low, high = 0, limit
 
-                    break
+    while low < high:
+        mid = (low + high + 1) // 2
 
-        return scope
+        if old[len(old) - mid:len(old) - low] == \
+                new[len(new) - mid:len(new) - low]:
+            low = mid
+        else:
+            high = mid - 1
 
-    def detect(self, lnum, ccol, src):
-        """Return context data about R chunks inside RMarkdown document"""
+    return low
 
-        LOGGER.info('[ncmR] subscope :: lnum: %s, ccol: %s, src: %s',
-                    lnum, ccol, src)
-        scope = self.get_scope(lnum, ccol, src)
 
-        if not scope:
+def is_structural(src, start, end):
+    """Check whether editing src between start and end can move the
+    boundaries of chunks
+
+    Chunks are delimited by fence lines. Blank lines don't count: the options
+    of a header may sit on the first non blank line after a lone fence, and
+    the body starts at the first non blank line after the header.
+
+    :returns: boolean
+    """
+
+    first = src.rfind('\n', 0, start) + 1
+    last = src.find('\n', end)
+    last = len(src) if last < 0 else last
+    lines = src[first:last].split('\n')
+
+    if any(line.startswith(FENCES) for line in lines):
+        return True
+
+    # Find the two first non blank lines above the edited lines
+    above = list()
+    while first > 0 and len(above) < 2:
+        line_start = src.rfind('\n', 0, first - 1) + 1
+        line = src[line_start:first - 1]
+
+        if line.strip():
+            above.append(line)
+
+        first = line_start
+
+    if above and above[0].strip() in FENCES:
+        # Editing the options of a header
+        return True
+
+    if not any(not line.strip() for line in lines):
+        return False
+
+    # Blank lines between the header and the body
+    return bool(above) and above[0].startswith(FENCES) or \
+        len(above) > 1 and above[1].strip() in FENCES
+
+
+class ChunkIndex:
+
+    """Offsets and line numbers of the R chunks of a document, updated
+    incrementally when the edit doesn't touch chunk boundaries
+
+    Chunks after the last edit aren't updated right away: chunks from index
+    _lazy onwards are shifted by _shift characters and _line_shift lines when
+    read, so that typing somewhere only updates the chunk being edited.
+    """
+
+    def __init__(self, src=''):
+        self._src = ''
+        self._chunks = list()
+        self._starts = list()
+        self._lnums = list()
+        self._rows = list()
+        self._lazy = 0
+        self._shift = 0
+        self._line_shift = 0
+        self._build(src)
+
+    def _build(self, src):
+        """Find all chunks of the document"""
+
+        self._src = src
+        self._chunks = [[chunk.start(), chunk.start(4), chunk.end(4),
+                         chunk.start(5), chunk.end(5)]
+                        for chunk in R_CHUNK.finditer(src)]
+        self._starts = [chunk[0] for chunk in self._chunks]
+
+        # Line number of the first line of each chunk
+        self._lnums = list()
+        lnum, last = 1, 0
+        for start in self._starts:
+            lnum += src.count('\n', last, start)
+            last = start
+            self._lnums.append(lnum)
+
+        # Offsets of the lines of each chunk, built when first needed
+        self._rows = [None] * len(self._chunks)
+        self._lazy = 0
+        self._shift = 0
+        self._line_shift = 0
+
+    def _count(self, pos):
+        """Return number of chunks starting at or before pos"""
+
+        idx = bisect_right(self._starts, pos, 0, self._lazy)
+
+        if idx < self._lazy:
+            return idx
+
+        return bisect_right(self._starts, pos - self._shift, self._lazy)
+
+    def _count_lines(self, lnum):
+        """Return number of chunks starting at or before line lnum"""
+
+        idx = bisect_right(self._lnums, lnum, 0, self._lazy)
+
+        if idx < self._lazy:
+            return idx
+
+        return bisect_right(self._lnums, lnum - self._line_shift, self._lazy)
+
+    def _move_lazy(self, idx):
+        """Shift chunks from idx onwards lazily, and chunks before for real"""
+
+        if idx > self._lazy:
+            shift, line_shift = self._shift, self._line_shift
+        else:
+            shift, line_shift = -self._shift, -self._line_shift
+
+        for num in range(min(idx, self._lazy), max(idx, self._lazy)):
+            self._chunks[num] = [o + shift for o in self._chunks[num]]
+            self._starts[num] += shift
+            self._lnums[num] += line_shift
+
+        self._lazy = idx
+
+    def _chunk(self, idx):
+        """Return offsets and first line number of a chunk"""
+
+        if idx >= self._lazy:
+            return ([o + self._shift for o in self._chunks[idx]],
+                    self._lnums[idx] + self._line_shift)
+
+        return self._chunks[idx], self._lnums[idx]
+
+    def _lines(self, idx, chunk):
+        """Return offsets of the lines of a chunk, relative to its start, up
+        to the line closing the chunk"""
+
+        if self._rows[idx] is None:
+            lines = self._src[chunk[0]:chunk[4]].split('\n')
+            self._rows[idx] = [0] + list(accumulate(len(line) + 1
+                                                    for line in lines[:-1]))
+
+        return self._rows[idx]
+
+    def update(self, src):
+        """Update the index for a new version of the document
+
+        When text is only edited inside chunks or between them, chunks after
+        the edit are shifted instead of searching the whole document again.
+        """
+
+        old = self._src
+
+        if src == old:
+            return
+
+        start = common_prefix(old, src)
+        suffix = common_suffix(old, src, min(len(old), len(src)) - start)
+        old_end = len(old) - suffix
+        new_end = len(src) - suffix
+
+        if is_structural(old, start, old_end) or \
+                is_structural(src, start, new_end):
+            self._build(src)
+            return
+
+        delta = len(src) - len(old)
+        after = self._count(start)
+        self._move_lazy(after)
+
+        if after:
+            # The edit may be inside the previous chunk
+            chunk = self._chunks[after - 1]
+            rows = self._rows[after - 1]
+
+            if rows is not None and start < chunk[4]:
+                # Replace the lines starting inside the edit
+                first = bisect_right(rows, start - chunk[0])
+                last = bisect_right(rows, old_end - chunk[0])
+                new_rows = [pos + 1 - chunk[0] for pos in range(start, new_end)
+                            if src[pos] == '\n']
+                rows[first:] = new_rows + [row + delta for row in rows[last:]]
+
+            self._chunks[after - 1] = [o + delta if o > start else o
+                                       for o in chunk]
+
+        self._shift += delta
+        self._line_shift += src.count('\n', start, new_end) - \
+            old.count('\n', start, old_end)
+        self._src = src
+
+    def locate(self, lnum, ccol):
+        """Return position of the cursor inside the chunk it is in
+
+        :lnum: line of the cursor in the document
+        :ccol: column of the cursor
+        :returns: ncm2 subscope context, None outside chunks
+        """
+
+        idx = self._count_lines(lnum) - 1
+
+        if idx < 0:
             return None
 
-        new_pos = scope['pos']
-        new_src = scope['src']
-        pos = 0
+        chunk, chunk_lnum = self._chunk(idx)
+        rows = self._lines(idx, chunk)
 
-        for numline, line in enumerate(new_src.split("\n")):
-            if pos < new_pos <= pos + len(line) + 1:
-                subctx = {}
-                subctx['scope'] = scope['scope']
-                subctx['scope_offset'] = scope['scope_offset']
-                subctx['scope_len'] = len(new_src)
+        if lnum - chunk_lnum >= len(rows):
+            return None
 
-                subctx['lnum'] = numline+1
-                subctx['col'] = new_pos - pos + 1
+        pos = chunk[0] + rows[lnum - chunk_lnum] + ccol - 1
+
+        for scope, start, end in (('rchunk', chunk[1], chunk[2]),
+                                  ('r', chunk[3], chunk[4])):
+            if start < end and start <= pos <= end:
+                break
+        else:
+            return None
+
+        if pos == start:
+            return None
+
+        # A position at the start of a line belongs to the end of the
+        # previous one
+        scope_row = bisect_right(rows, start - chunk[0]) - 1
+        row = bisect_left(rows, pos - chunk[0]) - 1
+        line_start = max(chunk[0] + rows[row], start)
+
+        return dict(scope=scope,
+                    scope_offset=start,
+                    scope_len=end - start,
+                    lnum=row - scope_row + 1,
+                    col=pos - line_start + 1,
+                    scope_lnum=chunk_lnum + scope_row,
+                    scope_ccol=start - chunk[0] - rows[scope_row] + 1)
+
+
+class SubscopeDetector(Ncm2Base):  # pylint: disable=too-few-public-methods
+
+    """Scoper for RMarkdown and Rnoweb"""
+
+    scope = ['rmd', 'rnoweb']
+
+    def __init__(self, nvim):
+        super(SubscopeDetector, self).__init__(nvim)
+
+        # ncm2 doesn't tell which buffer or changedtick src comes from, the
+        # index is kept up to date by comparing src with its last version
+        self._index = ChunkIndex()
+
+    def detect(self, lnum, ccol, src):
+        """Return context data about R chunks inside RMarkdown document"""
+
+        LOGGER.info('[ncmR] subscope :: lnum: %s, ccol: %s, src: %s',
+                    lnum, ccol, src)
 
-                lnum_col = self.pos2lccol(scope['scope_offset'], src)
-                subctx['scope_lnum'] = lnum_col[0]
-                subctx['scope_ccol'] = lnum_col[1]
-                LOGGER.info('[ncmR] subscope :: subctx2: %s', subctx)
-                return subctx
+        self._index.update(src)
+        subctx = self._index.locate(lnum, ccol)
 
-            pos += len(line) + 1
+        if subctx:
+            LOGGER.info('[ncmR] subscope :: subctx2: %s', subctx)
 
-        return None
+        return subctx
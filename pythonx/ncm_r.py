@@ -5,8 +5,11 @@ R Source for Neovim Completion Manager, to be used with nvim-R
 by Gabriel Alcaras
 """
 
-from os import listdir, path
+from os import listdir, path, stat
+from queue import Queue
 import re
+import threading
+import time
 
 from neovim.api import NvimError
 import vim # pylint: disable=E0401
@@ -14,35 +17,77 @@ import vim # pylint: disable=E0401
 from rsource import Rsource  # pylint: disable=E0401
 import filtr  # pylint: disable=E0401
 import rlang  # pylint: disable=E0401
-from omnils import add_snippet_var_inside_brackets
+from rindex import (  # pylint: disable=E0401
+    FuzzyIndex, PackageIndex, PrefixIndex, by_object, by_word)
+from rcache import iter_lines, load_all  # pylint: disable=E0401
+import rwatch  # pylint: disable=E0401
+from omnils import add_snippet_var_inside_brackets, remove_typed
 
 
 class Source(Rsource):  # pylint: disable=R0902
     """Completion Manager Source for R language"""
 
     R_WORD = re.compile(r'[\w\$_\.]+$')
+    R_ARGS = re.compile(r'[\w\$_\.\s,=]*$')
+
+    # Seconds after which GlobalEnvList is checked even though the watcher
+    # hasn't reported a change (e.g. tmp dir mounted over NFS or sshfs)
+    GLOBENV_TIMEOUT = 5
 
     def __init__(self, nvim):
         super(Source, self).__init__(nvim)
 
         self._pkg_loaded = list()
         self._pkg_installed = list()
-
-        self._all_matches = list()
+        self._pkg_files = dict()
+        self._pkg_parsed = set()
+        self._pkg_loading = set()
+        self._pkg_generation = dict()
+        self._pkg_libs = None
+        self._pkg_pushed = False
+
+        self._loader = None
+        self._load_queue = Queue()
+        self._last_ctx = None
+        self._fnc_outdated = False
+        self._truncated = False
+
+        self._all_matches = PackageIndex()
         self._pkg_matches = list()
         self._fnc_matches = list()
         self._obj_matches = list()
+        self._obj_tops = list()
+        self._obj_vars = dict()
+        self._fnc_words = dict()
+        self._obj_words = dict()
+        self._fnc_fuzzy = None
+        self._obj_fuzzy = None
+
+        self._refined = dict()
+        self._context_key = None
+        self._context = dict()
+
+        self._globenv_stat = None
+        self._globenv_lines = dict()
+        self._globenv_stale = True
+        self._globenv_checked = 0
+
+        self._watcher = rwatch.watcher(self._on_file_event)
 
         self.get_nvimr_settings()
         self.get_all_pkg_matches()
 
+        self._fnc_index = PrefixIndex(self._pkg_matches)
+
     def get_nvimr_settings(self):
         """Get Nvim-R settings to read completion files"""
 
         try:
-            self._settings['nvimr_id'] = self.nvim.eval('$NVIMR_ID')
-            self._settings['nvimr_tmp'] = self.nvim.eval('g:rplugin_tmpdir')
-            self._settings['nvimr_cmp'] = self.nvim.eval('g:rplugin_compldir')
+            nvimr = self.nvim.eval('[$NVIMR_ID, g:rplugin_tmpdir, '
+                                   'g:rplugin_compldir]')
+            self._settings['nvimr_id'] = nvimr[0]
+            self._settings['nvimr_tmp'] = nvimr[1]
+            self._settings['nvimr_cmp'] = nvimr[2]
         except NvimError:
             self._error('Can\'t load Nvim-R options. '
                         'Did you install the Nvim-R plugin?')
@@ -52,6 +97,82 @@ class Source(Rsource):  # pylint: disable=R0902
             self._settings['nvimr_tmp'],
             self._settings['nvimr_cmp']))
 
+        for dirpath in (self._settings['nvimr_tmp'],
+                        self._settings['nvimr_cmp']):
+            if dirpath and not self._watcher.watch(dirpath):
+                self._info('Can\'t watch {}, checking its files on every '
+                           'completion'.format(dirpath))
+
+    def _on_file_event(self, dirpath, filename):
+        """Hand file changes reported by the watcher thread over to the main
+        thread"""
+
+        self.nvim.async_call(self.on_file_changed, dirpath, filename)
+
+    def on_file_changed(self, dirpath, filename):
+        """Invalidate completion data affected by a changed file
+
+        :dirpath: directory of the file
+        :filename: name of the file, None if any file may have changed
+        """
+
+        if dirpath == self._settings['nvimr_tmp']:
+            if filename is None or filename.startswith('GlobalEnvList_'):
+                self._globenv_stale = True
+
+        if dirpath != self._settings['nvimr_cmp']:
+            return
+
+        try:
+            if filename is None:
+                for comp in listdir(dirpath):
+                    self.update_pkg_file(comp)
+
+                self.get_pkg_desc_matches()
+            elif filename == 'pack_descriptions':
+                self.get_pkg_desc_matches()
+            else:
+                self.update_pkg_file(filename)
+        except OSError as error:
+            self._error('Could not reload completion data', error)
+
+    def update_pkg_file(self, filename):
+        """Drop candidates of the R package of an omnils file that has
+        changed, parse it again if the package is loaded
+
+        :filename: name of the omnils file
+        """
+
+        pkg_match = re.search(r'_(.*)_', filename)
+
+        if 'omnils' not in filename or not pkg_match:
+            return
+
+        pkg_name = pkg_match.group(1)
+        filepath = path.join(self._settings['nvimr_cmp'], filename)
+
+        if path.exists(filepath):
+            self._pkg_files[pkg_name] = filepath
+
+            if pkg_name not in self._pkg_installed:
+                self._pkg_installed.append(pkg_name)
+        elif self._pkg_files.get(pkg_name) == filepath:
+            # The current file of the package was removed
+            del self._pkg_files[pkg_name]
+            self._pkg_installed.remove(pkg_name)
+        else:
+            return
+
+        # Candidates being parsed from the previous file are now outdated
+        self._pkg_generation[pkg_name] = \
+            self._pkg_generation.get(pkg_name, 0) + 1
+        self._pkg_parsed.discard(pkg_name)
+        self._all_matches.remove(pkg_name)
+
+        if pkg_name in self._pkg_loaded:
+            self._fnc_outdated = True
+            self.load_pkg_matches([pkg_name])
+
     def check_nvimr_started(self):
         """Check whether Nvim-R has started
 
@@ -69,6 +190,13 @@ class Source(Rsource):  # pylint: disable=R0902
 
         return True
 
+    def on_loaded_libs(self, pkg_libs):
+        """Receive loaded R packages, pushed whenever Nvim-R changes
+        g:rplugin_loaded_libs"""
+
+        self._pkg_libs = pkg_libs
+        self._pkg_pushed = True
+
     def update_loaded_pkgs(self):
         """Update list of loaded R packages
 
@@ -78,8 +206,10 @@ class Source(Rsource):  # pylint: disable=R0902
         old_pkgs = self._pkg_loaded[:]
 
         try:
-            pkg_loaded = self.nvim.eval('g:rplugin_loaded_libs')
-            self._pkg_loaded = list(reversed(pkg_loaded))
+            if self._pkg_libs is None:
+                self._pkg_libs = self.nvim.eval('g:rplugin_loaded_libs')
+
+            self._pkg_loaded = list(reversed(self._pkg_libs))
         except NvimError:
             self._error('Can\'t find loaded R packages. '
                         'Please start R using Nvim-R '
@@ -108,16 +238,61 @@ class Source(Rsource):  # pylint: disable=R0902
         if not self.check_nvimr_started():
             return
 
+        if self._watcher.is_watching(self._settings['nvimr_tmp']):
+            now = time.monotonic()
+
+            if not self._globenv_stale and \
+                    now - self._globenv_checked < self.GLOBENV_TIMEOUT:
+                return
+
+            self._globenv_stale = False
+            self._globenv_checked = now
+
         globenv_file = path.join(self._settings['nvimr_tmp'],
                                  'GlobalEnvList_' + self._settings['nvimr_id'])
 
         try:
-            with open(globenv_file, 'r') as globenv:
-                objs = [obj.strip() for obj in globenv.readlines()]
+            globenv_stat = stat(globenv_file)
+            globenv_stat = (globenv_stat.st_ino, globenv_stat.st_size,
+                            globenv_stat.st_mtime_ns)
+
+            if globenv_stat == self._globenv_stat:
+                return
+
+            obj_matches = self.update_obj_matches(iter_lines(globenv_file))
         except FileNotFoundError:
-            objs = list()
+            globenv_stat = None
+            obj_matches = self.update_obj_matches(list())
+
+        self._globenv_stat = globenv_stat
+        self._obj_matches = obj_matches
+        self._obj_words = by_word(self._obj_matches)
+        self._obj_tops, self._obj_vars = by_object(self._obj_matches)
+        self._obj_fuzzy = None
+
+    def update_obj_matches(self, objs):
+        """Return object matches, only building matches for new lines
 
-        self._obj_matches = self.matches.from_omnils(objs)
+        :objs: iterable of lines of the GlobalEnvList file
+        :returns: list of ncm matches
+        """
+
+        old_lines = self._globenv_lines
+        new_lines = dict()
+
+        obj_matches = list()
+        for obj in objs:
+            matches = old_lines.get(obj)
+
+            if matches is None:
+                matches = self.matches.from_omnils([obj])
+
+            new_lines[obj] = matches
+            obj_matches.extend(matches)
+
+        self._globenv_lines = new_lines
+
+        return obj_matches
 
     def get_all_pkg_matches(self):
         """Populate matches list with candidates from every R package"""
@@ -138,20 +313,12 @@ class Source(Rsource):  # pylint: disable=R0902
                     continue
 
                 self._pkg_installed.append(pkg_name)
+                self._pkg_files[pkg_name] = path.join(cmp, filename)
 
-                filepath = path.join(self._settings['nvimr_cmp'], filename)
-
-                with open(filepath, 'r') as omnil:
-                    comps = [pkg.strip() for pkg in omnil.readlines()]
+            if not self._settings['lazy_loading']:
+                self.load_pkg_matches(self._pkg_installed)
 
-                self._all_matches.extend(self.matches.from_omnils(comps))
-
-            pkg_desc = path.join(cmp, 'pack_descriptions')
-
-            with open(pkg_desc, 'r') as desc:
-                descriptions = [pkg.strip() for pkg in desc.readlines()]
-
-            self._pkg_matches.extend(self.matches.from_pkg_desc(descriptions))
+            self.get_pkg_desc_matches()
         except FileNotFoundError:
             self._error('Can\'t find completion files. Please load the '
                         'R packages you need (e.g. "base" or "utils").')
@@ -160,66 +327,280 @@ class Source(Rsource):  # pylint: disable=R0902
             self._error('Could not load completion data', error)
             raise
 
+    def get_pkg_desc_matches(self):
+        """Populate package candidates from the package descriptions"""
+
+        pkg_desc = path.join(self._settings['nvimr_cmp'], 'pack_descriptions')
+
+        with open(pkg_desc, 'r') as desc:
+            descriptions = [pkg.strip() for pkg in desc.readlines()]
+
+        self._pkg_matches = self.matches.from_pkg_desc(descriptions)
+        self._fnc_outdated = True
+
+    def load_pkg_matches(self, pkgs):
+        """Parse omnils files of R packages that haven't been parsed yet, in
+        a background thread
+
+        :pkgs: list of R packages
+        """
+
+        pkgs = [p for p in pkgs if p in self._pkg_files and
+                p not in self._pkg_parsed and p not in self._pkg_loading]
+
+        if not pkgs:
+            return
+
+        self._pkg_loading.update(pkgs)
+
+        if self._loader is None or not self._loader.is_alive():
+            self._loader = threading.Thread(target=self._load_worker,
+                                            daemon=True)
+            self._loader.start()
+
+        self._load_queue.put([(p, self._pkg_files[p],
+                               self._pkg_generation.get(p, 0))
+                              for p in pkgs])
+
+    def _load_worker(self):
+        """Parse omnils files sent to the load queue, then hand candidates
+        over to the main thread"""
+
+        while True:
+            batch = self._load_queue.get()
+            done = 0
+
+            try:
+                results = load_all(
+                    [f for _, f, _ in batch], self.matches.from_omnils,
+                    self._settings['parallel_loading'])
+
+                for (pkg_name, _, generation), (matches, error) in \
+                        zip(batch, results):
+                    if error:
+                        self.nvim.async_call(
+                            self._error,
+                            'Could not load completion data of ' + pkg_name,
+                            error)
+
+                    self.nvim.async_call(self.add_pkg_matches, pkg_name,
+                                         matches, generation)
+                    done += 1
+            except Exception as error:  # pylint: disable=broad-except
+                # Keep the thread alive, and don't leave packages loading
+                # forever (completion would wait for them)
+                self.nvim.async_call(self._error,
+                                     'Could not load completion data', error)
+
+                for pkg_name, _, generation in batch[done:]:
+                    self.nvim.async_call(self.add_pkg_matches, pkg_name,
+                                         list(), generation)
+
+    def add_pkg_matches(self, pkg_name, matches, generation=0):
+        """Add candidates of an R package parsed in the background, refresh
+        completion once loaded packages are ready
+
+        :pkg_name: name of the R package
+        :matches: list of candidates
+        :generation: version of the omnils file the candidates come from
+        """
+
+        self._pkg_loading.discard(pkg_name)
+
+        if generation != self._pkg_generation.get(pkg_name, 0):
+            # The omnils file changed while it was parsed, parse it again
+            if pkg_name in self._pkg_loaded:
+                self.load_pkg_matches([pkg_name])
+
+            return
+
+        self._pkg_parsed.add(pkg_name)
+        self._all_matches.add(matches)
+
+        if pkg_name not in self._pkg_loaded:
+            return
+
+        self._fnc_outdated = True
+
+        if not self.is_loading() and self._last_ctx:
+            self.on_complete(self._last_ctx)
+
+    def is_loading(self):
+        """Check whether some loaded R packages are still being parsed
+
+        :returns: boolean
+        """
+
+        return any(p in self._pkg_loading for p in self._pkg_loaded)
+
     def get_data_matches(self):
         """Return list of matches with datasets from R packages"""
 
-        pkg_matches = filtr.pkg(self._all_matches, self._pkg_loaded)
-        data = filtr.struct(pkg_matches, 'data.frame')
-        data.extend(filtr.struct(pkg_matches, 'tbl_df'))
+        # Queue omnils files of loaded packages that haven't been parsed yet
+        self.update_func_matches()
 
-        return data
+        return self._all_matches.get(self._pkg_loaded,
+                                     ['data.frame', 'tbl_df'])
 
     def update_func_matches(self):
         """Update function matches if necessary"""
 
-        if self.update_loaded_pkgs():
+        if self.update_loaded_pkgs() or self._fnc_outdated:
             self._info('Update loaded R packages: %s', self._pkg_loaded)
-            funcs = filtr.pkg(self._all_matches, self._pkg_loaded)
-            funcs = filtr.struct(funcs, 'function')
+            self._fnc_outdated = False
+            self.load_pkg_matches(self._pkg_loaded)
+            funcs = self._all_matches.get(self._pkg_loaded, 'function')
             self._fnc_matches = funcs
+            self._fnc_words = by_word(funcs)
+            self._fnc_index = PrefixIndex(funcs + self._pkg_matches)
+            self._fnc_fuzzy = None
+
+    def limit_matches(self, candidates, used=0):
+        """Return the first candidates that fit in g:ncm_r_max_matches, so that
+        only those are turned into ncm matches and sent to ncm2
+
+        :candidates: list of candidates, best ranked first
+        :used: number of matches already returned for this completion
+        :returns: list of candidates
+        """
+
+        max_matches = self._settings['max_matches']
+
+        if max_matches <= 0:
+            return candidates
+
+        room = max(max_matches - used, 0)
+
+        if len(candidates) > room:
+            self._truncated = True
+            return candidates[:room]
 
-    def get_matches(self, word, pkg=None, pipe=None, data=None):
+        return candidates
+
+    def limit_word_matches(self, candidates, word):
+        """Same as limit_matches() for lists that aren't filtered by word
+        (e.g. packages inside library()), which only keep candidates starting
+        with word when they don't all fit
+
+        :candidates: list of candidates
+        :word: string typed
+        :returns: list of candidates
+        """
+
+        max_matches = self._settings['max_matches']
+
+        if word and 0 < max_matches < len(candidates):
+            candidates = filtr.word(candidates, word)
+
+        return self.limit_matches(candidates)
+
+    def refine_matches(self, name, universe, typed, query, key=None, hide=''):
+        """Return candidates starting with typed, narrowing down the previous
+        result when typed extends the previously typed string
+
+        :name: name of the result (e.g. 'obj' or 'func')
+        :universe: list or index the candidates come from
+        :typed: filter candidates with this string
+        :query: function returning candidates from universe from scratch
+        :key: other parameters the result depends on (e.g. R package)
+        :hide: filter out candidates containing this string
+        :returns: list of candidates
+        """
+
+        last = self._refined.get(name)
+
+        if last and last['universe'] is universe and last['key'] == key \
+                and last['hide'] == hide and last['typed'] \
+                and typed.startswith(last['typed']):
+            result = filtr.word(last['result'], typed, hide=hide)
+        else:
+            result = query()
+
+        self._refined[name] = dict(universe=universe, key=key, hide=hide,
+                                   typed=typed, result=result)
+
+        return result
+
+    def get_matches(self, word, pkg=None, pipe=None, data=None, used=0):
         """Return function and object matches based on given word
 
         :word: string to filter matches with
         :pkg: only show functions from R package
         :pipe: piped data
+        :used: number of matches already returned for this completion
         :returns: list of ncm matches
         """
 
         self.get_all_obj_matches()
-        obj_m = self._obj_matches
+        hide = ''
+        variables = True
 
         if pipe or data:
             # Inside data pipeline or data brackets, keep variables from piped
             # data
             dataframe = pipe if pipe else data
-            obj_m = filtr.word(obj_m, dataframe + '$', rm_typed=True)
+            typed = dataframe + '$'
+        elif '$' in word:
+            # If we're looking inside a data frame or tibble, only return
+            # its variables
+            typed = word
+        else:
+            # Otherwise, hide what's inside data.frames
+            typed = word
+            hide = '$'
+            variables = False
+
+        if variables:
+            # Only look at the variables of the object
+            obj_m = self._obj_vars.get(typed.partition('$')[0], [])
+        else:
+            obj_m = self._obj_tops
+
+        if self._settings['fuzzy_matching'] and not variables:
+            if self._obj_fuzzy is None:
+                self._obj_fuzzy = FuzzyIndex(obj_m)
 
-            if data:
-                obj_m = add_snippet_var_inside_brackets(obj_m)
+            obj_m = self._obj_fuzzy.match(typed, hide=hide)
         else:
-            if '$' in word:
-                # If we're looking inside a data frame or tibble, only return
-                # its variables
-                obj_m = filtr.word(obj_m, word, rm_typed=True)
-            else:
-                # Otherwise, hide what's inside data.frames
-                obj_m = filtr.word(obj_m, word, hide='$')
+            obj_m = self.refine_matches(
+                'obj', obj_m, typed,
+                lambda: filtr.word(obj_m, typed, hide=hide), hide=hide)
+
+        # Objects come first, functions fill the remaining room
+        matches = self.matches.to_ncm(self.limit_matches(obj_m, used))
+
+        if variables:
+            matches = remove_typed(matches, typed)
 
-        matches = obj_m
+        if data:
+            matches = add_snippet_var_inside_brackets(matches)
 
         # Get functions from loaded R packages
         self.update_func_matches()
-        func_m = filtr.pkg(self._fnc_matches, pkg)
 
-        if not pkg:
-            func_m.extend(self._pkg_matches)
+        if pkg:
+            func_m = list()
 
-        if not pkg or (pkg and word):
-            func_m = filtr.word(func_m, word)
+            if pkg in self._pkg_loaded:
+                func_m = self._all_matches.get(pkg, 'function')
 
-        matches.extend(func_m)
+            func_m = self.refine_matches(
+                'func', self._fnc_matches, word,
+                lambda: filtr.word(func_m, word) if word else func_m,
+                key=pkg)
+        elif self._settings['fuzzy_matching']:
+            if self._fnc_fuzzy is None:
+                self._fnc_fuzzy = FuzzyIndex(self._fnc_matches +
+                                             self._pkg_matches)
+
+            func_m = self._fnc_fuzzy.match(word)
+        else:
+            func_m = self.refine_matches(
+                'func', self._fnc_index, word,
+                lambda: self._fnc_index.prefix(word))
+
+        func_m = self.limit_matches(func_m, used + len(matches))
+        matches.extend(self.matches.to_ncm(func_m))
 
         return matches
 
@@ -233,20 +614,29 @@ class Source(Rsource):  # pylint: disable=R0902
         """
 
         if func in ('library', 'require'):
-            return self._pkg_matches
+            return self.matches.to_ncm(
+                self.limit_word_matches(self._pkg_matches, word))
 
         if func in 'data':
-            return self.get_data_matches()
+            return self.matches.to_ncm(
+                self.limit_word_matches(self.get_data_matches(), word))
+
+        # Arguments are looked up before get_matches(), which would only
+        # update functions and objects afterwards
+        self.update_func_matches()
+        self.get_all_obj_matches()
 
+        # Functions from the most recently loaded packages mask the others
         args = list()
-        for matches in [self._fnc_matches, self._obj_matches]:
-            tmp_args = filtr.arg(matches, func, pipe)
+        for words in [self._fnc_words, self._obj_words]:
+            tmp_args = filtr.arg(words.get(func, []), func, pipe)
             args.extend(tmp_args)
 
             if len(args) > 1:
                 break
 
-        objs = self.get_matches(word, pipe=pipe, data=data)
+        args = self.matches.to_ncm(self.limit_matches(args))
+        objs = self.get_matches(word, pipe=pipe, data=data, used=len(args))
 
         matches = list()
         if pipe:
@@ -256,17 +646,83 @@ class Source(Rsource):  # pylint: disable=R0902
 
         return matches
 
-    def on_complete(self, ctx):
-        """Refresh NCM list of matches"""
+    def get_lines(self, ctx):
+        """Return the lines parsers look back at, from the top of the
+        look-back window to the current line
 
-        cur_buffer = self.nvim.current.buffer
-        lnum = ctx['lnum']
-        col = ctx['ccol']
+        :ctx: ncm2 context
+        :returns: list of lines
+        """
+
+        first = 0
 
         if ctx['filetype'] in ('rnoweb', 'rmd'):
-            cur_buffer = cur_buffer[ctx['scope_lnum']-1:]
+            first = ctx['scope_lnum'] - 1
+
+        last = first + ctx['lnum']
+        lookback = self._settings['lookback_lines']
+
+        if lookback > 0:
+            first = max(first, last - 1 - lookback)
+
+        if self._pkg_pushed:
+            # Slicing current.buffer would take two requests (buffer, then
+            # lines): getline() fetches the lines in a single one
+            return self.nvim.call('getline', first + 1, last)
+
+        # Loaded R packages aren't pushed by Nvim-R (e.g. on Vim 8), get them
+        # in the same request as the lines
+        try:
+            lines, self._pkg_libs = self.nvim.eval(
+                '[getline({}, {}), g:rplugin_loaded_libs]'.format(first + 1,
+                                                                  last))
+        except NvimError:
+            self._pkg_libs = None
+            lines = self.nvim.call('getline', first + 1, last)
+
+        return lines
+
+    def get_context(self, ctx, lines):
+        """Return parsed context of the cursor, reusing the previous one while
+        typing inside the same list of arguments
+
+        :ctx: ncm2 context
+        :lines: lines from get_lines()
+        :returns: context dictionary (see rlang.get_context)
+        """
+
+        lnum = len(lines)
+        col = ctx['ccol']
+        typed = lines[-1][0:col - 1]
+        bracket = rlang.get_open_bracket_col(typed)
+
+        key = None
+
+        # Typing words, commas or "=" after the last unclosed bracket can't
+        # change the function or the pipe, as long as lines above the cursor
+        # and the line up to the bracket are the same
+        if bracket != -1 and self.R_ARGS.match(typed, bracket + 1):
+            key = (ctx['bufnr'], ctx['lnum'], typed[0:bracket + 1],
+                   lines[-1][col - 1:col], lines[:-1])
+
+        if key is None or key != self._context_key:
+            self._context = rlang.get_context(lines, lnum, col, typed)
+            self._context_key = key
+            return self._context
+
+        context = dict(self._context)
+        context['data'] = rlang.get_df_inside_brackets(typed)
+
+        return context
+
+    def on_complete(self, ctx):
+        """Refresh NCM list of matches"""
+
+        self._last_ctx = ctx
+        self._truncated = False
+        cur_buffer = self.get_lines(ctx)
 
-        if re.match('^#', cur_buffer[lnum-1]):
+        if re.match('^#', cur_buffer[-1]):
             return
 
         word_match = re.search(self.R_WORD, ctx['typed'])
@@ -274,15 +730,15 @@ class Source(Rsource):  # pylint: disable=R0902
 
         isinquot = re.search('["\']' + word + '$', ctx['typed'])
 
-        function = rlang.get_function(cur_buffer, lnum, col)
-        pkg = function[0]
-        func = function[1]
+        context = self.get_context(ctx, cur_buffer)
+        pkg = context['pkg']
+        func = context['func']
 
         if isinquot and func and not re.search('(library|require|data)', func):
             return
 
-        pipe = rlang.get_pipe(cur_buffer, lnum, col)
-        data = rlang.get_df_inside_brackets(ctx['typed'])
+        pipe = context['pipe']
+        data = context['data']
 
         self._info('word: "{}", func: "{}", pkg: {}, pipe: {}, data: {}'.format(
             word, func, pkg, pipe, data))
@@ -297,9 +753,13 @@ class Source(Rsource):  # pylint: disable=R0902
 
             matches = self.get_matches(word, pkg=pkg)
 
-        self.complete(ctx, ctx['startccol'], matches)
+        # Ask ncm2 to complete again while R packages are being parsed, or if
+        # matches were left out (they may match what's typed next)
+        self.complete(ctx, ctx['startccol'], matches,
+                      self.is_loading() or self._truncated)
 
 
 SOURCE = Source(vim)
 
 on_complete = SOURCE.on_complete
+on_loaded_libs = SOURCE.on_loaded_libs
@@ -5,18 +5,23 @@ R Chunk Options Source for Neovim Completion Manager
 by Gabriel Alcaras
 """
 
+from os import path, stat
+
+from neovim.api import NvimError
 import vim # pylint: disable=E0401
 
 from rsource import Rsource  # pylint: disable=E0401
 import filtr  # pylint: disable=E0401
 import rlang  # pylint: disable=E0401
+from rcache import iter_lines  # pylint: disable=E0401
+from rindex import by_word  # pylint: disable=E0401
 
 
 class Source(Rsource):  # pylint: disable=too-few-public-methods
     """Completion Manager Source for R Chunk options"""
 
     # https://github.com/yihui/yihui.name/blob/master/content/knitr/options.md
-    CHUNK_OPTIONS = [
+    CHUNK_OPTIONS = (
         'aniopts="controls,loop"',
         'autodep=FALSE',
         'background="#F7F7F7"',
@@ -69,7 +74,7 @@ class Source(Rsource):  # pylint: disable=too-few-public-methods
         'out.width="7in"',
         'prompt=FALSE',
         'purl=TRUE',
-        'R.options= '
+        'R.options= ',
         'ref.label= ',
         'resize.height= ',
         'resize.width= ',
@@ -79,46 +84,128 @@ class Source(Rsource):  # pylint: disable=too-few-public-methods
         'tidy.opts= ',
         'tidy=FALSE',
         'warning=TRUE',
-    ]
+    )
 
-    CHUNK_OPTIONS_TEX = [
+    CHUNK_OPTIONS_TEX = (
         'external=TRUE',
         'sanitize=FALSE',
         'size="normalsize"',
-    ]
+    )
 
-    CHUNK_OPTIONS_RMD = [
+    CHUNK_OPTIONS_RMD = (
         'class.output=""',
         'class.source=""',
         'fig.retina=1',
         'collapse=FALSE',
-    ]
+    )
+
+    # Options only available in some document types
+    FILETYPE_OPTIONS = {
+        'rnoweb': CHUNK_OPTIONS_TEX,
+        'rmd': CHUNK_OPTIONS_RMD,
+    }
 
     def __init__(self, nvim):
         super(Source, self).__init__(nvim)
 
         self._info('rchunk :: init')
 
-        self._options = list()
-        options = self.CHUNK_OPTIONS
+        self._options = dict()
+        self._discovered_stat = None
+        self.build_all_options()
+
+    def build_all_options(self, discovered=()):
+        """Build option matches of each document type, R scripts get the
+        common options
+
+        :discovered: options found by the R session, added to the built-in
+                     options they're missing from
+        """
+
+        for filetype, options in [('', ())] + \
+                list(self.FILETYPE_OPTIONS.items()):
+            options = self.CHUNK_OPTIONS + options
+            self._options[filetype] = self.build_options(
+                options + self.get_missing_options(discovered, options))
+
+    @staticmethod
+    def get_missing_options(options, known):
+        """Return options whose name isn't among the known options
+
+        Built-in options come with the values they accept, so they're kept
+        over the discovered ones.
+        """
+
+        names = {option.split('=')[0].strip() for option in known}
+
+        return tuple(option for option in options
+                     if option.split('=')[0].strip() not in names)
+
+    def get_discovered_options(self):
+        """Rebuild option matches when the R session has written its chunk
+        options to the ChunkOptions file in Nvim-R's temporary directory
+        since last completion"""
 
-        if self._settings['filetype'] == 'rnoweb':
-            options.extend(self.CHUNK_OPTIONS_TEX)
+        if not self._settings['nvimr_id']:
+            try:
+                nvimr = self.nvim.eval("[$NVIMR_ID, "
+                                       "get(g:, 'rplugin_tmpdir', '')]")
+                self._settings['nvimr_id'] = nvimr[0]
+                self._settings['nvimr_tmp'] = nvimr[1]
+            except NvimError:
+                return
 
-        if self._settings['filetype'] == 'rmd':
-            options.extend(self.CHUNK_OPTIONS_RMD)
+            if not self._settings['nvimr_id']:
+                return
 
-        options = sorted(options, key=str.lower)
-        self._options = self.matches.from_chunk_options(options)
+        options_file = path.join(self._settings['nvimr_tmp'],
+                                 'ChunkOptions_' + self._settings['nvimr_id'])
+
+        try:
+            options_stat = stat(options_file)
+            options_stat = (options_stat.st_mtime_ns, options_stat.st_size)
+
+            if options_stat == self._discovered_stat:
+                return
+
+            discovered = tuple(line for line in iter_lines(options_file)
+                               if line)
+        except FileNotFoundError:
+            if self._discovered_stat is None:
+                return
+
+            options_stat = None
+            discovered = ()
+        except OSError as error:
+            self._error('Could not read chunk options', error)
+            return
+
+        self._info('rchunk :: discovered {} options'.format(len(discovered)))
+        self._discovered_stat = options_stat
+        self.build_all_options(discovered)
+
+    def build_options(self, options):
+        """Return option matches sorted by name, and indexed by name
+
+        :options: tuple of options with their default value
+        :returns: (list of matches, dictionary of lists of matches)
+        """
+
+        matches = self.matches.from_chunk_options(sorted(options,
+                                                         key=str.lower))
+
+        return matches, by_word(matches)
 
     def on_complete(self, ctx):
         """Refresh NCM list of matches"""
 
-        matches = self._options
+        self.get_discovered_options()
+
+        matches, words = self._options.get(ctx['filetype'], self._options[''])
         option = rlang.get_option(ctx['typed'])
 
         if option:
-            matches = filtr.arg(matches, option)
+            matches = filtr.arg(words.get(option, []), option)
 
         self._info('ncm_rchunk :: option: {}, typed: "{}",'
                    'ccol: {}, scope_len: {}'.format(option, ctx['typed'],
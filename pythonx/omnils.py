@@ -18,6 +18,60 @@ def add_snippet(match_dct, snip):
     match_dct['user_data'] = {'snippet': snip, 'is_snippet': 1}
     return match_dct
 
+
+def get_title(info):
+    """Return title of an object given its omniline info (between \\x08 and
+    the last \\x05)"""
+
+    start = info.find('\x08')
+
+    if start == -1:
+        return ''
+
+    end = info.rfind('\x05')
+
+    if end <= start:
+        return ''
+
+    return info[start + 1:end].strip()
+
+
+class Candidate:  # pylint: disable=too-few-public-methods
+
+    """Compact completion candidate, turned into an NCM match only when
+    sent to ncm2"""
+
+    __slots__ = ('word', 'struct', 'pkg', 'info', '_args')
+
+    def __init__(self, word='', struct='', pkg='', info=''):
+        self.word = word
+        self.struct = struct
+        self.pkg = pkg
+        self.info = info
+        self._args = None
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __reduce__(self):
+        return (Candidate, (self.word, self.struct, self.pkg, self.info))
+
+    @property
+    def args(self):
+        """Argument candidates of a function, built on first lookup"""
+
+        if self._args is None:
+            self._args = list()
+
+            if self.struct == 'function':
+                function = Function(word=self.word, info=self.info)
+                self._args = [Candidate(word=arg, struct='argument')
+                              for arg in function.args
+                              if arg not in ('NO_ARGS', '...')]
+
+        return self._args
+
+
 class Function:  # pylint: disable=too-few-public-methods
 
     """Function object to generate snippet and arguments."""
@@ -29,10 +83,18 @@ class Function:  # pylint: disable=too-few-public-methods
         self._info = info
 
         self.args = list()
-        self.snippet = ''
+        self._snippet = ''
 
         self._get_args()
-        self._make_snippet()
+
+    @property
+    def snippet(self):
+        """Function snippet, made on first lookup"""
+
+        if not self._snippet:
+            self._make_snippet()
+
+        return self._snippet
 
     def _get_args(self):
         """Get function arguments based on omniline info"""
@@ -40,24 +102,18 @@ class Function:  # pylint: disable=too-few-public-methods
         if not self._info:
             return
 
-        if re.search('\x08', self._info):
-            splits = re.split('\x08', self._info)
-            args = splits[0]
-        else:
-            args = self._info
-
-        args = re.split('\t', args)
-        args = [arg.replace('\x07', ' = ') for arg in args]
+        args = self._info.partition('\x08')[0]
+        args = [arg.replace('\x07', ' = ') for arg in args.split('\t')]
 
         self.args = args
 
     def _make_snippet(self):
         """Create function snippet with its arguments"""
 
-        self.snippet = self._word + '('
+        snippet = self._word + '('
 
         if self.args[0] == 'NO_ARGS':
-            self.snippet += ')'
+            self._snippet = snippet + ')'
             return
 
         # Get arguments without no default value (usually mandatory arguments)
@@ -67,14 +123,14 @@ class Function:  # pylint: disable=too-few-public-methods
             if arg in ('...') and numarg > 0:
                 continue
 
-            self.snippet += '${' + str(numarg + 1) + ':' + arg + '}, '
+            snippet += '${' + str(numarg + 1) + ':' + arg + '}, '
 
         if len(mand_args) >= 1:
-            self.snippet = self.snippet[:-2]
+            snippet = snippet[:-2]
         else:
-            self.snippet += '$1'
+            snippet += '$1'
 
-        self.snippet += ')'
+        self._snippet = snippet + ')'
 
 
 class Match:  # pylint: disable=too-few-public-methods
@@ -164,18 +220,7 @@ class Match:  # pylint: disable=too-few-public-methods
         """
 
         match = dict(word=word, struct=struct, pkg=pkg, info=info)
-
-        if match['info']:
-            obj_title = re.search(r'\x08(.*)\x05', match['info'])
-
-            if obj_title:
-                match['title'] = obj_title.group(1).strip()
-
-        title = ''
-
-        if 'title' in match:
-            title = match['title']
-            del match['title']
+        title = get_title(info)
 
         match['menu'] = self._menu(self._col(match['pkg'], 1, brackets=True),
                                    self._col(match['struct'], 2),
@@ -207,14 +252,6 @@ class Match:  # pylint: disable=too-few-public-methods
         """Process match when it's a function."""
 
         function = Function(word=match['word'], info=match['info'])
-
-        match['args'] = list()
-        for arg in function.args:
-            if arg in ('NO_ARGS', '...'):
-                continue
-
-            match['args'].append(self.build(word=arg, struct='argument'))
-
         add_snippet(match, function.snippet)
 
         return match
@@ -322,34 +359,42 @@ class Matches:
 
         self.match.setup(settings)
 
+    def to_ncm(self, candidates):
+        """Return list of NCM matches given a list of candidates"""
+
+        return [self.match.build(word=cand.word, struct=cand.struct,
+                                 pkg=cand.pkg, info=cand.info)
+                for cand in candidates if cand]
+
     def from_omnils(self, lines):
-        """Return list matches given lines of an omnils file"""
+        """Return list of candidates given lines of an omnils file"""
 
         matches = list()
 
         for line in lines:
-            parts = re.split('\x06', line)
+            parts = line.strip().split('\x06', 5)
 
             if len(parts) >= 5:
-                matches.append(self.match.build(word=parts[0],
-                                                struct=parts[1],
-                                                pkg=parts[3],
-                                                info=parts[4]))
+                matches.append(Candidate(word=parts[0],
+                                         struct=parts[1],
+                                         pkg=parts[3],
+                                         info=parts[4]))
 
         return matches
 
     def from_pkg_desc(self, lines):
-        """Return list of matches given lines of package description file"""
+        """Return list of candidates given lines of package description
+        file"""
 
         matches = list()
 
         for line in lines:
-            parts = re.split('\t', line)
+            parts = line.split('\t')
 
             if len(parts) >= 2:
-                matches.append(self.match.build(word=parts[0],
-                                                info=parts[1],
-                                                struct='package'))
+                matches.append(Candidate(word=parts[0],
+                                         info=parts[1],
+                                         struct='package'))
 
         return matches
 
@@ -364,6 +409,16 @@ class Matches:
         return matches
 
 
+def remove_typed(matches, typed):
+    """Return matches without the typed string in their word (e.g. the name
+    of the dataframe of a variable)"""
+
+    for match in matches:
+        match['word'] = match['word'].replace(typed, '')
+
+    return matches
+
+
 def add_snippet_var_inside_brackets(matches=None):
     """Return matches with snippets for variables when selecting columns of
     a dataframe inside brackets"""
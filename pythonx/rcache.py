@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+ncm-R: tools to read completion files
+
+by Gabriel Alcaras
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from multiprocessing import get_all_start_methods, get_context
+
+
+def iter_lines(filepath):
+    """Yield stripped lines of a completion file, one at a time
+
+    Nvim-R rewrites some of these files in place (e.g. GlobalEnvList), so
+    they're read as regular files: a file shrinking while it's read only
+    cuts the lines short.
+    """
+
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as comp:
+        for line in comp:
+            yield line.strip()
+
+
+def try_load(filepath, build):
+    """Return matches of a completion file, and the error raised while
+    reading it if any, so that it can run in a worker process
+
+    :filepath: path to the completion file
+    :build: function returning matches given lines of the file
+    :returns: (list of ncm matches, OSError or None)
+    """
+
+    try:
+        return build(iter_lines(filepath)), None
+    except OSError as error:
+        return list(), error
+
+
+def load_all(filepaths, build, processes=0):
+    """Yield matches of several completion files, in order, parsing them
+    in a pool of processes if asked
+
+    :filepaths: list of paths to completion files
+    :build: function returning matches given lines of a file
+    :processes: number of worker processes, 0 to parse files one by one
+    :returns: generator of (list of ncm matches, OSError or None)
+    """
+
+    # Workers are forked even though the source runs other threads (nvim
+    # event loop, file watcher): spawn and forkserver would run the main
+    # script of the yarp host again in each worker. Forked workers only
+    # parse files with rcache and omnils, which don't share locks with
+    # those threads.
+    if processes < 1 or len(filepaths) < 2 or \
+            'fork' not in get_all_start_methods():
+        for filepath in filepaths:
+            yield try_load(filepath, build)
+        return
+
+    chunksize = max(1, len(filepaths) // (processes * 4))
+    done = 0
+
+    try:
+        with ProcessPoolExecutor(processes,
+                                 mp_context=get_context('fork')) as pool:
+            for result in pool.map(try_load, filepaths,
+                                   repeat(build), chunksize=chunksize):
+                done += 1
+                yield result
+    except BrokenProcessPool:
+        # A worker died, parse the remaining files one by one
+        for filepath in filepaths[done:]:
+            yield try_load(filepath, build)
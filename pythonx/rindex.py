@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+ncm-R: tools to index matches
+
+by Gabriel Alcaras
+"""
+
+from bisect import bisect_left
+
+
+class PrefixIndex:
+
+    """Sorted array of match words to answer prefix queries with bisect"""
+
+    def __init__(self, ncm_matches=None):
+        """Build index from a list of matches
+
+        :ncm_matches: list of matches (dictionaries)
+        """
+
+        self._matches = list(ncm_matches) if ncm_matches else list()
+
+        order = sorted(range(len(self._matches)),
+                       key=lambda idx: self._matches[idx]['word'])
+
+        self._words = [self._matches[idx]['word'] for idx in order]
+        self._order = order
+
+    def prefix(self, typed=''):
+        """Return matches whose word starts with typed, in their original
+        order
+
+        :typed: filter matches with this string
+        :returns: list of matches
+        """
+
+        if not typed:
+            return list()
+
+        first = bisect_left(self._words, typed)
+        upper = typed[:-1] + chr(ord(typed[-1]) + 1)
+        last = bisect_left(self._words, upper, first)
+
+        return [self._matches[idx] for idx in sorted(self._order[first:last])]
+
+
+def char_mask(string):
+    """Return bitmask of the characters of a string (a character is in the
+    string only if its bit is set)"""
+
+    mask = 0
+
+    for char in set(string):
+        mask |= 1 << (ord(char) & 63)
+
+    return mask
+
+
+class FuzzyIndex:
+
+    """Lowercase words and character bitmasks of matches to answer fuzzy
+    queries, rejecting most matches without looking at their word"""
+
+    def __init__(self, ncm_matches=None):
+        """Build index from a list of matches
+
+        :ncm_matches: list of matches (dictionaries)
+        """
+
+        self._matches = list(ncm_matches) if ncm_matches else list()
+        self._keys = [match['word'].lower() for match in self._matches]
+        self._masks = [char_mask(key) for key in self._keys]
+
+    def match(self, typed='', hide=''):
+        """Return matches whose word contains the characters of typed in the
+        same order, ignoring case
+
+        Matches starting with typed come first, then matches containing
+        typed, then the others by how close their matching characters are.
+        Ties keep the original order.
+
+        :typed: filter matches with this string
+        :hide: filter out matches containing this string
+        :returns: list of matches
+        """
+
+        if not typed:
+            return list()
+
+        typed = typed.lower()
+        typed_mask = char_mask(typed)
+        scores = list()
+
+        for idx, key in enumerate(self._keys):
+            if typed_mask & self._masks[idx] != typed_mask:
+                continue
+
+            if hide and hide in key:
+                continue
+
+            if key.startswith(typed):
+                scores.append((0, 0, idx))
+                continue
+
+            pos = key.find(typed)
+
+            if pos >= 0:
+                scores.append((1, pos, idx))
+                continue
+
+            first = last = key.find(typed[0])
+
+            for char in typed[1:]:
+                last = key.find(char, last + 1)
+
+                if last < 0:
+                    break
+            else:
+                scores.append((2, last - first, idx))
+
+        scores.sort()
+
+        return [self._matches[score[2]] for score in scores]
+
+
+class PackageIndex:
+
+    """Matches of R packages grouped by package name and type (str() in R)"""
+
+    def __init__(self):
+        self._index = dict()
+
+    def add(self, ncm_matches):
+        """Add matches to the index
+
+        :ncm_matches: list of matches (dictionaries)
+        """
+
+        for match in ncm_matches:
+            structs = self._index.setdefault(match['pkg'], dict())
+            structs.setdefault(match['struct'], list()).append(match)
+
+    def remove(self, pkg):
+        """Remove matches of an R package from the index"""
+
+        self._index.pop(pkg, None)
+
+    def get(self, pkgs, strcts):
+        """Return matches of given types from given R packages
+
+        :pkgs: name or list of names of R packages
+        :strcts: type or list of types of matches
+        :returns: list of matches, grouped by type, then by package
+        """
+
+        packages = [pkgs] if isinstance(pkgs, str) else pkgs
+        structs = [strcts] if isinstance(strcts, str) else strcts
+
+        matches = list()
+        for strct in structs:
+            for pack in packages:
+                matches.extend(self._index.get(pack, dict()).get(strct, []))
+
+        return matches
+
+
+def by_word(ncm_matches):
+    """Index matches by word
+
+    Matches sharing the same word keep the order of ncm_matches, so that the
+    first one is the one masking the others (e.g. the function from the most
+    recently loaded R package).
+
+    :ncm_matches: list of matches
+    :returns: dictionary of lists of matches
+    """
+
+    index = dict()
+
+    for match in ncm_matches:
+        index.setdefault(match['word'], list()).append(match)
+
+    return index
+
+
+def by_object(ncm_matches):
+    """Split matches of the global environment into objects and variables of
+    objects (e.g. columns of a data frame, written as "object$variable")
+
+    Variables are indexed by the name of their top-level object, so that
+    nested variables ("object$list$variable") are found with their object.
+
+    :ncm_matches: list of matches
+    :returns: (list of objects, dictionary of lists of variables)
+    """
+
+    objects = list()
+    variables = dict()
+
+    for match in ncm_matches:
+        name, dollar, _ = match['word'].partition('$')
+
+        if dollar:
+            variables.setdefault(name, list()).append(match)
+        else:
+            objects.append(match)
+
+    return objects, variables
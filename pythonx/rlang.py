@@ -7,51 +7,135 @@ by Gabriel Alcaras
 
 import re
 
+R_FUNC = re.compile(r'((?P<pkg>[\w\._]+)::)?((?P<fnc>[\w\._]+)\()?[^\(^:]*$')
+R_PARAM = re.compile(r',\s*$')
+R_BLOCK = re.compile(r'<-')
+R_PIPE = re.compile(r'([\w_\.\$]+)\s?%>%')
+R_PIPELINE = re.compile(r'%>%')
+R_PIPELINE_END = re.compile(r'(%>%|\)\s?\+|,)\s*$')
+R_DF_BRACKETS = re.compile(r'(\w+)\[[^\[\]]*,[^\[\]]*$')
 
-def get_pipe(buff, numline, numcol):
-    """Check if completion happens inside a pipe, if so, return the piped
-    data
 
-    :buff: vim buffer
-    :numline: line number
-    :numcol: column number
-    :returns: piped data
-    """
+class _FunctionParser:  # pylint: disable=too-few-public-methods
 
-    pipe = None
-    r_pipe = re.compile(r'([\w_\.\$]+)\s?%>%')
-    r_block = re.compile(r'<-')
+    """Find the function (and its package) the cursor is in"""
 
-    no_pipe = 0
-    for numl in range(numline - 1, -1, -1):
-        line = buff[numl]
+    def __init__(self):
+        self.done = False
+        self.pkg = ''
+        self.func = ''
+        self._no_func = 0
+
+    def parse(self, line, is_current, is_first):
+        """Parse one line, going up from the cursor
+
+        :line: line content (up to the cursor on the current line)
+        :is_current: line is where the cursor is currently at
+        :is_first: line is the first one of the buffer
+        """
+
+        open_bracket = get_open_bracket_col(line)
 
-        if numl == numline - 1:
-            # If line is where the cursor is currently at
-            line = line[0:numcol]
-            r_pipeline = re.compile(r'%>%')
+        if open_bracket == -1:
+            if R_PARAM.search(line):
+                return
+
+            self._no_func += 1
+            begin_block = R_BLOCK.match(line)
+
+            # The line could be the last line of a list of arguments,
+            # go to next iteration to check previous line...
+            if begin_block or self._no_func == 2:
+                # Unless the line clearly begins a block or the line below this
+                # one does not match an argument either
+                self.done = True
+                return
         else:
-            r_pipeline = re.compile(r'(%>%|\)\s?\+|,)\s*$')
+            line = line[0:open_bracket + 1]
+
+        func_match = R_FUNC.search(line)
+        func = func_match.group('fnc') if func_match else ''
+        pkg = func_match.group('pkg') if func_match else ''
+
+        if (pkg and is_current) or func:
+            self.pkg = pkg
+            self.func = func
+            self.done = True
+            return
+
+        if is_first:
+            self.done = True
+
+
+class _PipeParser:  # pylint: disable=too-few-public-methods
+
+    """Find the data piped into the pipeline the cursor is in"""
+
+    def __init__(self):
+        self.done = False
+        self.pipe = None
+        self._no_pipe = 0
+
+    def parse(self, line, is_current):
+        """Parse one line, going up from the cursor
+
+        :line: line content (up to the cursor on the current line)
+        :is_current: line is where the cursor is currently at
+        """
+
+        r_pipeline = R_PIPELINE if is_current else R_PIPELINE_END
 
         if r_pipeline.search(line):
             # If line clearly continues data pipeline
-            has_pipe = r_pipe.search(line)
+            has_pipe = R_PIPE.search(line)
 
             if has_pipe:
-                pipe = has_pipe.group(1)
-                break
+                self.pipe = has_pipe.group(1)
+                self.done = True
         else:
-            no_pipe += 1
-            begin_block = r_block.match(line)
+            self._no_pipe += 1
+            begin_block = R_BLOCK.match(line)
 
             # The line could be the last line of a pipeline,
             # go to next iteration to check previous line...
-            if begin_block or no_pipe == 2:
+            if begin_block or self._no_pipe == 2:
                 # Unless the line clearly begins a block or the line below this
                 # one does not match a pipeline either
-                break
+                self.done = True
+
+
+def get_context(buff, numline, numcol, typed=''):
+    """Parse code before the cursor in a single pass over the lines
+
+    :buff: vim buffer
+    :numline: line number
+    :numcol: column number
+    :typed: typed content of the current line
+    :returns: dictionary with the package and the function the cursor is in
+              (pkg, func), the piped data (pipe) and the name of the data
+              frame when the cursor is inside brackets (data)
+    """
+
+    func_parser = _FunctionParser()
+    pipe_parser = _PipeParser()
+
+    for numl in range(numline - 1, -1, -1):
+        line = buff[numl]
+        is_current = numl == numline - 1
+
+        if not func_parser.done:
+            func_line = line[0:numcol - 1] if is_current else line
+            func_parser.parse(func_line, is_current, numl == 0)
+
+        if not pipe_parser.done:
+            pipe_line = line[0:numcol] if is_current else line
+            pipe_parser.parse(pipe_line, is_current)
+
+        if func_parser.done and pipe_parser.done:
+            break
 
-    return pipe
+    return dict(pkg=func_parser.pkg, func=func_parser.func,
+                pipe=pipe_parser.pipe, data=get_df_inside_brackets(typed))
 
 
 def get_open_bracket_col(typed=''):
@@ -93,61 +177,6 @@ def get_open_bracket_col(typed=''):
     return result
 
 
-def get_function(buff, numline, numcol):
-    """Return function and package name of current line
-
-    :buff: vim buffer
-    :numline: line number
-    :numcol: column number
-    :returns: [package_name, function_name]
-    """
-
-    result = list()
-    r_func = re.compile((r'((?P<pkg>[\w\._]+)::)?' +
-                         r'((?P<fnc>[\w\._]+)\()?[^\(^:]*$'))
-    r_param = re.compile(r',\s*$')
-    r_block = re.compile(r'<-')
-
-    no_func = 0
-    for numl in range(numline - 1, -1, -1):
-        line = buff[numl]
-
-        line = line[0:numcol - 1] if numl == numline - 1 else line
-
-        open_bracket = get_open_bracket_col(line)
-
-        if open_bracket == -1:
-            if r_param.search(line):
-                continue
-
-            no_func += 1
-            begin_block = r_block.match(line)
-
-            # The line could be the last line of a list of arguments,
-            # go to next iteration to check previous line...
-            if begin_block or no_func == 2:
-                # Unless the line clearly begins a block or the line below this
-                # one does not match an argument either
-                result = ['', '']
-                break
-        else:
-            line = line[0:open_bracket + 1]
-
-        func_match = re.search(r_func, line)
-        func = func_match.group('fnc') if func_match else ''
-        pkg = func_match.group('pkg') if func_match else ''
-
-        if (pkg and numl == numline - 1) or func:
-            result = [pkg, func]
-            break
-
-        if numl == 0 and not pkg and not func:
-            result = ['', '']
-            break
-
-    return result
-
-
 def get_option(typed=''):
     """Return option name when assigning its value"""
 
@@ -165,8 +194,7 @@ def get_df_inside_brackets(typed=''):
     if not typed:
         return ''
 
-    df_brackets = re.compile(r'(\w+)\[[^\[\]]*,[^\[\]]*$')
-    df_match = df_brackets.search(typed)
+    df_match = R_DF_BRACKETS.search(typed)
 
     if df_match:
         return df_match.group(1)
@@ -24,11 +24,17 @@ class Rsource(Ncm2Source):  # pylint: disable=too-few-public-methods
         self._settings = dict()
 
         try:
-            settings = dict()
-            settings['col1_len'] = self.nvim.eval('g:ncm_r_column1_length')
-            settings['col2_len'] = self.nvim.eval('g:ncm_r_column2_length')
-            settings['col_layout'] = self.nvim.eval('g:ncm_r_column_layout')
-            settings['filetype'] = self.nvim.eval('&filetype')
+            # Get all options in a single request
+            settings = self.nvim.eval(
+                "{'col1_len': g:ncm_r_column1_length,"
+                " 'col2_len': g:ncm_r_column2_length,"
+                " 'col_layout': g:ncm_r_column_layout,"
+                " 'filetype': &filetype,"
+                " 'fuzzy_matching': g:ncm_r_fuzzy_matching,"
+                " 'lazy_loading': g:ncm_r_lazy_loading,"
+                " 'lookback_lines': g:ncm_r_lookback_lines,"
+                " 'max_matches': g:ncm_r_max_matches,"
+                " 'parallel_loading': g:ncm_r_parallel_loading}")
 
             settings['nvimr_id'] = ''
             settings['nvimr_tmp'] = ''
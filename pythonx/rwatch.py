@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+ncm-R: tools to watch completion files
+
+by Gabriel Alcaras
+"""
+
+import ctypes
+import ctypes.util
+from os import read, scandir
+import struct
+import sys
+import threading
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0x00080000
+
+IN_EVENT = struct.Struct('iIII')
+
+
+class Watcher:
+
+    """Call a function when files of watched directories change, from
+    a background thread"""
+
+    def __init__(self, callback):
+        """Initialize watcher
+
+        :callback: function called with the directory and the name of the
+                   changed file, or None if changes may have been missed
+        """
+
+        self._callback = callback
+        self._dirs = set()
+        self._thread = None
+
+    def is_watching(self, dirpath):
+        """Check whether files of the directory are watched"""
+
+        return dirpath in self._dirs
+
+    def watch(self, dirpath):
+        """Start watching files of a directory
+
+        :returns: boolean, True if the directory is watched
+        """
+
+        if dirpath in self._dirs:
+            return True
+
+        if not self._add(dirpath):
+            return False
+
+        self._dirs.add(dirpath)
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        return True
+
+    def _add(self, dirpath):
+        """Start watching a directory, return False on failure"""
+
+        raise NotImplementedError
+
+    def _run(self):
+        """Report changes, forever"""
+
+        raise NotImplementedError
+
+
+class InotifyWatcher(Watcher):
+
+    """Watch directories with Linux inotify"""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+    def __init__(self, callback, libc):
+        super(InotifyWatcher, self).__init__(callback)
+
+        self._libc = libc
+        self._wds = dict()
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def _add(self, dirpath):
+        wd = self._libc.inotify_add_watch(self._fd, dirpath.encode(),
+                                          self.MASK)
+
+        if wd < 0:
+            return False
+
+        self._wds[wd] = dirpath
+
+        return True
+
+    def _run(self):
+        while True:
+            data = read(self._fd, 64 * 1024)
+            pos = 0
+
+            while pos < len(data):
+                wd, mask, _, length = IN_EVENT.unpack_from(data, pos)
+                pos += IN_EVENT.size
+                name = data[pos:pos + length].rstrip(b'\0').decode(
+                    errors='replace')
+                pos += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, every file might have changed
+                    for dirpath in list(self._wds.values()):
+                        self._callback(dirpath, None)
+                elif wd in self._wds and name:
+                    self._callback(self._wds[wd], name)
+
+
+class PollingWatcher(Watcher):
+
+    """Watch directories by comparing the stat of their files periodically"""
+
+    INTERVAL = 0.5
+
+    def __init__(self, callback):
+        super(PollingWatcher, self).__init__(callback)
+
+        self._snapshots = dict()
+
+    @staticmethod
+    def _snapshot(dirpath):
+        """Return inode, size and mtime of each file of the directory"""
+
+        snapshot = dict()
+
+        with scandir(dirpath) as entries:
+            for entry in entries:
+                try:
+                    file_stat = entry.stat()
+                except OSError:
+                    continue
+
+                snapshot[entry.name] = (file_stat.st_ino, file_stat.st_size,
+                                        file_stat.st_mtime_ns)
+
+        return snapshot
+
+    def _add(self, dirpath):
+        try:
+            self._snapshots[dirpath] = self._snapshot(dirpath)
+        except OSError:
+            return False
+
+        return True
+
+    def _run(self):
+        while True:
+            time.sleep(self.INTERVAL)
+
+            for dirpath in list(self._dirs):
+                try:
+                    snapshot = self._snapshot(dirpath)
+                except OSError:
+                    continue
+
+                old_snapshot = self._snapshots[dirpath]
+                self._snapshots[dirpath] = snapshot
+
+                for name in set(snapshot) | set(old_snapshot):
+                    if snapshot.get(name) != old_snapshot.get(name):
+                        self._callback(dirpath, name)
+
+
+def watcher(callback):
+    """Return an inotify watcher when available, a polling one otherwise
+
+    :callback: see Watcher
+    :returns: Watcher
+    """
+
+    libc_name = ctypes.util.find_library('c')
+
+    if not sys.platform.startswith('linux') or libc_name is None:
+        return PollingWatcher(callback)
+
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        libc.inotify_init1  # pylint: disable=pointless-statement
+        return InotifyWatcher(callback, libc)
+    except (AttributeError, OSError):
+        return PollingWatcher(callback)
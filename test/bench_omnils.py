@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarking ncm-R omnils parsing
+
+by Gabriel Alcaras
+"""
+
+from os import path
+import re
+import sys
+import timeit
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             '..', 'pythonx'))
+
+import omnils  # pylint: disable=E0401,C0413
+
+LINES = 50000
+REPEAT = 5
+
+
+def make_omnils(size):
+    """Return content of an omnils file with size functions"""
+
+    lines = list()
+
+    for num in range(size):
+        lines.append('\x06'.join([
+            'fun_{}'.format(num), 'function', '0', 'pkg',
+            'x\tna.rm\x07FALSE\tsep\x07" "\t...'
+            '\x08Title of function {}\x05Description'.format(num)]))
+
+    return '\n'.join(lines) + '\n'
+
+
+def regex_lines(content):
+    """Split lines into fields the way ncm-R used to"""
+
+    lines = [line.strip() for line in content.split('\n')]
+    return [re.split('\x06', line) for line in lines]
+
+
+def regex_title(info):
+    """Extract title the way ncm-R used to"""
+
+    title = re.search(r'\x08(.*)\x05', info)
+    return title.group(1).strip() if title else ''
+
+
+def regex_args(info):
+    """Extract arguments the way ncm-R used to"""
+
+    if re.search('\x08', info):
+        args = re.split('\x08', info)[0]
+    else:
+        args = info
+
+    return [arg.replace('\x07', ' = ') for arg in re.split('\t', args)]
+
+
+def bench(func, *args):
+    """Return time in ms to run func"""
+
+    total = timeit.timeit(lambda: func(*args), number=REPEAT)
+    return total / REPEAT * 1000
+
+
+def main():
+    """Print time spent on each step of omnils parsing, with regular
+    expressions and with the current parser"""
+
+    content = make_omnils(LINES)
+    candidates = omnils.Matches().from_omnils(content.split('\n'))
+    infos = [cand.info for cand in candidates]
+
+    assert [c.word for c in candidates] == \
+        [p[0] for p in regex_lines(content) if len(p) >= 5]
+    assert [omnils.get_title(i) for i in infos] == \
+        [regex_title(i) for i in infos]
+    assert [omnils.Function(info=i).args for i in infos] == \
+        [regex_args(i) for i in infos]
+
+    print('{} lines'.format(LINES))
+    print('{:<10} {:>12} {:>12}'.format('step', 'regex (ms)', 'str (ms)'))
+    print('{:<10} {:>12.1f} {:>12.1f}'.format(
+        'lines', bench(regex_lines, content),
+        bench(omnils.Matches().from_omnils, content.split('\n'))))
+    print('{:<10} {:>12.1f} {:>12.1f}'.format(
+        'titles', bench(lambda: [regex_title(i) for i in infos]),
+        bench(lambda: [omnils.get_title(i) for i in infos])))
+    print('{:<10} {:>12.1f} {:>12.1f}'.format(
+        'arguments', bench(lambda: [regex_args(i) for i in infos]),
+        bench(lambda: [omnils.Function(info=i).args for i in infos])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarking ncm-R code parsing
+
+by Gabriel Alcaras
+"""
+
+from os import path
+import sys
+import timeit
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)),
+                             '..', 'pythonx'))
+
+import rlang  # pylint: disable=E0401,C0413
+
+SIZES = [100, 1000, 10000]
+LOOKBACK = 100
+REPEAT = 200
+
+
+def pipeline(size):
+    """Long data pipeline, cursor inside the last function call"""
+
+    buff = ['sleep %>%']
+    buff.extend(['  mutate(extra = extra * 2) %>%'] * size)
+    buff.append('  filter(ex')
+
+    return buff
+
+
+def arguments(size):
+    """Long list of arguments, cursor on the last one"""
+
+    buff = ['x <- c(']
+    buff.extend(['  1,'] * size)
+    buff.append('  me')
+
+    return buff
+
+
+def script(size):
+    """Lines of unrelated code, cursor at the end of the buffer"""
+
+    buff = ['x <- mean(sleep$extra)'] * size
+    buff.append('me')
+
+    return buff
+
+
+def bench(buff, lookback=0):
+    """Return time in ms to parse the context at the end of buff"""
+
+    lines = buff[-lookback - 1:] if lookback else buff
+    numline = len(lines)
+    typed = lines[-1]
+    numcol = len(typed) + 1
+
+    total = timeit.timeit(
+        lambda: rlang.get_context(lines, numline, numcol, typed),
+        number=REPEAT)
+
+    return total / REPEAT * 1000
+
+
+def main():
+    """Print per-keystroke parse cost for each buffer shape and size"""
+
+    print('{:<10} {:>7} {:>14} {:>14}'.format(
+        'buffer', 'lines', 'full (ms)', 'lookback (ms)'))
+
+    for make_buff in (pipeline, arguments, script):
+        for size in SIZES:
+            buff = make_buff(size)
+            print('{:<10} {:>7} {:>14.4f} {:>14.4f}'.format(
+                make_buff.__name__, len(buff),
+                bench(buff), bench(buff, LOOKBACK)))
+
+
+if __name__ == '__main__':
+    main()
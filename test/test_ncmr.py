@@ -222,6 +222,20 @@ TEST = TestCase('Is ncm-R working inside Rmd chunk?',
 feedkeys(['$i'])
 TEST.ask()
 
+TEST = TestCase('Is ncm-R working at the end of a 30,000 lines Rmd chunk?',
+                ['```{r}'] + ['x <- 1'] * 30000 + ['library(', '```'],
+                ftype='Rmd')
+feedkeys(['Gk', 'A'])
+TEST.ask()
+
+TEST = TestCase('Is ncm-R working in a Rmd document with 2,000 chunks?',
+                ['Some text', '```{r}', 'x <- 1', '```'] * 1000 +
+                ['```{r}', 'library(', '```'] +
+                ['Some text', '```{r}', 'x <- 1', '```'] * 1000,
+                ftype='Rmd')
+feedkeys(['4003G', 'A'])
+TEST.ask()
+
 # ==== IT'S  OVER ==== #
 TEST = TestCase(r'Testing is over \o/')
 TEST.ask()